@@ -1,3 +1,5 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from typing import Iterable, Iterator
 
 
@@ -42,11 +44,165 @@ def solution_2(sections: Iterable[tuple[range, range]]) -> int:
     return sum(1 for pair in sections if find_overlap(*pair))
 
 
+class SectionIndex:
+    """
+    Every elf's section built once into an index for ad-hoc range queries.
+    Elves are (pair number, 0 or 1) in order of the input.
+
+    Sections overlapping [x, y] are those not starting after y and not ending
+    before x, so counting them takes two bisects over sorted starts and ends.
+    Sections containing [x, y] start at most at x and end at least at y, both
+    kinds of query are a prefix of sections by start with ends above a bound.
+    Listing them walks a max tree of ends over sections sorted by start, down
+    the subtrees that have a match: O(n) memory, O(log n) per listed section.
+    Counting containing sections needs a Fenwick tree keeping the ends (with
+    elves) of its nodes sorted: a prefix of sections by start is O(log n) nodes,
+    in each of them matching ends are a suffix found by a bisect. It stores
+    every section about log n times, so it's built on the first such count:
+    O(n log n) time and memory, about 4s and 170MB for a million sections.
+    Section numbers must be non-negative
+    """
+
+    def __init__(self, sections: Iterable[tuple[range, range]]) -> None:
+        intervals = sorted(
+            (section[0], section[-1], 2 * pair_idx + elf_idx)
+            for pair_idx, pair in enumerate(sections)
+            for elf_idx, section in enumerate(pair)
+        )
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = sorted(end for _, end, _ in intervals)
+        self.elves = array("Q", (elf for _, _, elf in intervals))
+        # Node leaves + i is interval i, every other node holds the largest end
+        # below it, -1 where there are no intervals
+        self.leaves = 1 << max(len(intervals) - 1, 0).bit_length()
+        self.max_ends = array("q", [-1]) * self.leaves + array("q", (end for _, end, _ in intervals))
+        self.max_ends.extend(array("q", [-1]) * (self.leaves - len(intervals)))
+        max_ends = self.max_ends
+        for i in range(self.leaves - 1, 0, -1):
+            max_ends[i] = max(max_ends[2 * i], max_ends[2 * i + 1])
+        self._nodes: list[array] | None = None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _fenwick_nodes(self) -> list[array]:
+        # Node i covers intervals (i - lowbit(i), i], 1-based, and keeps them as
+        # end << 32 | elf sorted. Its range is the one of interval i and nodes
+        # i - 1, i - 2, i - 4, ... below lowbit(i), so it's a merge of sorted runs
+        if self._nodes is None:
+            nodes = [array("Q")]
+            ends = self.max_ends[self.leaves : self.leaves + len(self)]
+            for i, (end, elf) in enumerate(zip(ends, self.elves), start=1):
+                keys = [end << 32 | elf]
+                step = 1
+                while step < i & -i:
+                    keys.extend(nodes[i - step])
+                    step <<= 1
+                nodes.append(array("Q", sorted(keys)))
+            self._nodes = nodes
+        return self._nodes
+
+    def _count(self, num_of_intervals: int, min_end: int) -> int:
+        nodes = self._fenwick_nodes()
+        count = 0
+        i = num_of_intervals
+        while i:
+            count += len(nodes[i]) - bisect_left(nodes[i], min_end << 32)
+            i -= i & -i
+        return count
+
+    def _collect(self, num_of_intervals: int, min_end: int) -> list[tuple[int, int]]:
+        """
+        Elves among first num_of_intervals by start with an end of at least
+        min_end
+        """
+        max_ends, leaves = self.max_ends, self.leaves
+        found: list[int] = []
+        # Node, first interval below it and number of intervals below it
+        pending = [(1, 0, leaves)]
+        while pending:
+            node, first, width = pending.pop()
+            if first >= num_of_intervals or max_ends[node] < min_end:
+                continue
+            if width <= 16:
+                # Scanning a few leaves beats walking down to each of them
+                for i in range(first, min(first + width, num_of_intervals)):
+                    if max_ends[leaves + i] >= min_end:
+                        found.append(self.elves[i])
+            else:
+                width >>= 1
+                pending.append((2 * node, first, width))
+                pending.append((2 * node + 1, first + width, width))
+        return sorted(divmod(elf, 2) for elf in found)
+
+    def count_overlapping(self, x: int, y: int) -> int:
+        return bisect_right(self.starts, y) - bisect_left(self.ends, x)
+
+    def overlapping(self, x: int, y: int) -> list[tuple[int, int]]:
+        return self._collect(bisect_right(self.starts, y), x)
+
+    def count_containing(self, x: int, y: int) -> int:
+        return self._count(bisect_right(self.starts, x), y)
+
+    def containing(self, x: int, y: int) -> list[tuple[int, int]]:
+        return self._collect(bisect_right(self.starts, x), y)
+
+    def count_overlapping_many(self, queries: Iterable[tuple[int, int]]) -> list[int]:
+        return [self.count_overlapping(x, y) for x, y in queries]
+
+    def count_containing_many(self, queries: Iterable[tuple[int, int]]) -> list[int]:
+        return [self.count_containing(x, y) for x, y in queries]
+
+
+def read_chunks(filename: str, chunk_size: int = 1 << 24) -> Iterator[bytes]:
+    """
+    Read file in chunks of whole lines
+    """
+    try:
+        f = open(filename, "rb")
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+    else:
+        with f:
+            tail = b""
+            while chunk := f.read(chunk_size):
+                chunk = tail + chunk
+                end = chunk.rfind(b"\n") + 1
+                tail = chunk[end:]
+                yield chunk[:end]
+            if tail:
+                yield tail
+
+
+def solve_columnar(filename: str, chunk_size: int = 1 << 24) -> tuple[int, int]:
+    """
+    Both solutions in one pass: every chunk of pairs is parsed into four NumPy
+    columns a0, a1, b0, b1 and scored with vectorized comparisons.
+    Memory is bounded by chunk size
+    """
+    import numpy as np
+
+    separators = bytes.maketrans(b"-,", b"  ")
+    contained = overlapping = 0
+    for chunk in read_chunks(filename, chunk_size):
+        numbers = np.fromstring(chunk.translate(separators).decode(), dtype=np.int64, sep=" ")
+        a0, a1, b0, b1 = numbers.reshape(-1, 4).T
+        contained += int(np.count_nonzero(((a0 <= b0) & (b1 <= a1)) | ((b0 <= a0) & (a1 <= b1))))
+        overlapping += int(np.count_nonzero(np.maximum(a0, b0) <= np.minimum(a1, b1)))
+    return contained, overlapping
+
+
 def main() -> None:
     assert solution_1(parse_input("input_example")) == 2
     print(solution_1(parse_input("input")))
     assert solution_2(parse_input("input_example")) == 4
     print(solution_2(parse_input("input")))
+    assert solve_columnar("input_example") == (2, 4)
+
+    index = SectionIndex(parse_input("input_example"))
+    assert index.count_overlapping(7, 7) == 6
+    assert index.overlapping(1, 2) == [(0, 0), (1, 0), (3, 0), (5, 0)]
+    assert index.count_containing_many([(4, 6), (2, 8)]) == [5, 1]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+"""
+Fragmented stack: crates are dealt one at a time onto a stack from two others
+in turn, then the whole stack is moved back and forth. Seconds for both phases
+on the list and segment plants.
+Run from the day directory: python benchmark.py [crates] [moves]
+"""
+import sys
+import time
+from array import array
+
+from solution import CratePlant, CratePlantv2, Job, SegmentCratePlant, SegmentCratePlantv2
+
+
+def make_plant(plant_class, num_of_crates: int):
+    plant = plant_class()
+    half = num_of_crates // 2
+    plant.create_stack(*("A" * half), positon=1)
+    plant.create_stack(*("B" * half), positon=2)
+    plant.create_stack("C", positon=3)
+    plant.create_stack("D", positon=4)
+    # Single crates from alternating stacks can't be joined into longer segments
+    plant.add_jobs(array("I", [1, 2] * half), array("I", [3] * 2 * half), array("I", [1] * 2 * half))
+    return plant
+
+
+def measure(plant_class, num_of_crates: int, num_of_moves: int) -> tuple[float, float]:
+    """
+    Seconds to fragment the stack and seconds to move it whole afterwards
+    """
+    plant = make_plant(plant_class, num_of_crates)
+    start = time.perf_counter()
+    plant.perform_jobs()
+    dealt = time.perf_counter()
+    size = len(plant.stacks[3])
+    for i in range(num_of_moves):
+        plant.move_crates(Job(3, 4, size) if i % 2 == 0 else Job(4, 3, size))
+    return dealt - start, time.perf_counter() - dealt
+
+
+def main() -> None:
+    num_of_crates = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    num_of_moves = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    for plant_class in (CratePlant, SegmentCratePlant, CratePlantv2, SegmentCratePlantv2):
+        deal, moves = measure(plant_class, num_of_crates, num_of_moves)
+        print(f"{plant_class.__name__:20} deal {deal:.2f}s, {num_of_moves} whole moves {moves:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,482 @@
 import re
+from array import array
 from collections import defaultdict, namedtuple
+from random import random
+from typing import Iterable, Iterator
 
 Job = namedtuple("Job", ["start", "target", "amount"])
 
 
 class CratePlant:
+    # Crates are moved one at a time, so a moved run lands reversed
+    reverses_order = True
+
     def __init__(self) -> None:
-        self.stacks: dict[int, list[str]] = {}
-        self.jobs: list[Job] = []
+        self.stacks: dict[int, list[str] | SegmentStack] = {}
+        # Jobs are stored column-wise
+        self.starts = array("I")
+        self.targets = array("I")
+        self.amounts = array("I")
+
+    @property
+    def jobs(self) -> list[Job]:
+        return [Job(*job) for job in zip(self.starts, self.targets, self.amounts)]
 
     def create_stack(self, *crates: str, positon: int) -> None:
         self.stacks[positon] = list(crates)
 
     def add_job(self, job: Job) -> None:
-        self.jobs.append(job)
+        self.starts.append(job.start)
+        self.targets.append(job.target)
+        self.amounts.append(job.amount)
+
+    def add_jobs(self, starts: array, targets: array, amounts: array) -> None:
+        self.starts.extend(starts)
+        self.targets.extend(targets)
+        self.amounts.extend(amounts)
 
     def move_crates(self, job: Job) -> None:
-        for _ in range(job.amount):
-            last_crate = self.stacks[job.start].pop()
-            self.stacks[job.target].append(last_crate)
+        self.move(job.start, job.target, job.amount)
+
+    def move(self, start: int, target: int, amount: int) -> None:
+        if not amount:
+            return
+        stack = self.stacks[start]
+        # Like popping one crate at a time, fail instead of moving fewer
+        if amount > len(stack):
+            raise IndexError("pop from empty stack")
+        self.stacks[target].extend(stack[: -amount - 1 : -1])
+        del stack[-amount:]
 
     def perform_jobs(self) -> None:
-        for job in self.jobs:
-            self.move_crates(job)
+        move = self.move
+        for start, target, amount in zip(self.starts, self.targets, self.amounts):
+            move(start, target, amount)
 
     def get_top_crates(self) -> str:
         return "".join(crates[-1] for _, crates in sorted(self.stacks.items()))
 
+    def resolve_top_crates(self) -> str:
+        """
+        Top crates after all jobs without performing them: follow every final top
+        slot backwards through the jobs to the crate it held initially.
+        A slot is (stack, depth from the top), stacks stay untouched
+        """
+        heights = {positon: len(crates) for positon, crates in self.stacks.items()}
+        for start, target, amount in zip(self.starts, self.targets, self.amounts):
+            heights[start] -= amount
+            heights[target] += amount
+        slots = {positon: (positon, 0) for positon, height in heights.items() if height}
+        jobs = zip(reversed(self.starts), reversed(self.targets), reversed(self.amounts))
+        for start, target, amount in jobs:
+            if start == target:
+                continue
+            for positon, (stack, depth) in slots.items():
+                if stack == target:
+                    if depth < amount:
+                        depth = amount - 1 - depth if self.reverses_order else depth
+                        stack = start
+                    else:
+                        depth -= amount
+                elif stack == start:
+                    depth += amount
+                else:
+                    continue
+                slots[positon] = (stack, depth)
+        return "".join(
+            self.stacks[stack][-1 - depth] for _, (stack, depth) in sorted(slots.items())
+        )
+
     def __str__(self) -> str:
         d = dict(sorted(self.stacks.items()))
         return "\n".join(f"{k}: {v}" for k, v in d.items())
 
 
 class CratePlantv2(CratePlant):
-    def move_crates(self, job: Job) -> None:
-        _stack = []
-        for _ in range(job.amount):
-            _stack.append(self.stacks[job.start].pop())
-        self.stacks[job.target].extend(reversed(_stack))
+    reverses_order = False
+
+    def move(self, start: int, target: int, amount: int) -> None:
+        if not amount:
+            return
+        stack = self.stacks[start]
+        # Like popping one crate at a time, fail instead of moving fewer
+        if amount > len(stack):
+            raise IndexError("pop from empty stack")
+        self.stacks[target].extend(stack[-amount:])
+        del stack[-amount:]
+
+
+class Segment:
+    """
+    View of crates[start:stop] that is never copied, read backwards if reversed
+    """
+
+    __slots__ = ("crates", "start", "stop", "reversed")
+
+    def __init__(self, crates: tuple[str, ...], start: int, stop: int, reversed: bool = False) -> None:
+        self.crates = crates
+        self.start = start
+        self.stop = stop
+        self.reversed = reversed
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def split(self, size: int) -> tuple["Segment", "Segment"]:
+        """
+        Bottom size crates and the rest on top of them
+        """
+        if self.reversed:
+            middle = self.stop - size
+            return (
+                Segment(self.crates, middle, self.stop, True),
+                Segment(self.crates, self.start, middle, True),
+            )
+        middle = self.start + size
+        return Segment(self.crates, self.start, middle), Segment(self.crates, middle, self.stop)
+
+    def flipped(self) -> "Segment":
+        return Segment(self.crates, self.start, self.stop, not self.reversed)
+
+    def __iter__(self) -> Iterator[str]:
+        crates = self.crates[self.start : self.stop]
+        return reversed(crates) if self.reversed else iter(crates)
+
+
+class RopeNode:
+    """
+    Node of a rope: a segment of crates with the crates below it in the left
+    subtree and the ones above it in the right one. Nodes are heap ordered by
+    random priorities (a treap), so depth is logarithmic with high probability.
+    A set flip means the whole subtree reads reversed, it's pushed down to
+    the children only when the node is visited
+    """
+
+    __slots__ = ("segment", "left", "right", "priority", "size", "flip")
+
+    def __init__(self, segment: Segment) -> None:
+        self.segment = segment
+        self.left: RopeNode | None = None
+        self.right: RopeNode | None = None
+        self.priority = random()
+        self.size = len(segment)
+        self.flip = False
+
+    def push_flip(self) -> None:
+        if self.flip:
+            self.left, self.right = self.right, self.left
+            if self.left is not None:
+                self.left.flip = not self.left.flip
+            if self.right is not None:
+                self.right.flip = not self.right.flip
+            self.segment = self.segment.flipped()
+            self.flip = False
+
+    def update(self) -> None:
+        self.size = (
+            len(self.segment)
+            + (self.left.size if self.left is not None else 0)
+            + (self.right.size if self.right is not None else 0)
+        )
+
+
+def merge_ropes(bottom: RopeNode | None, top: RopeNode | None) -> RopeNode | None:
+    """
+    Rope of top stacked on bottom
+    """
+    if bottom is None:
+        return top
+    if top is None:
+        return bottom
+    if bottom.priority > top.priority:
+        bottom.push_flip()
+        bottom.right = merge_ropes(bottom.right, top)
+        bottom.update()
+        return bottom
+    top.push_flip()
+    top.left = merge_ropes(bottom, top.left)
+    top.update()
+    return top
+
+
+def split_rope(node: RopeNode | None, size: int) -> tuple[RopeNode | None, RopeNode | None]:
+    """
+    Bottom size crates and the rest on top of them, splitting at most one
+    segment
+    """
+    if node is None:
+        return None, None
+    node.push_flip()
+    below = node.left.size if node.left is not None else 0
+    if size <= below:
+        bottom, node.left = split_rope(node.left, size)
+        node.update()
+        return bottom, node
+    if size >= below + len(node.segment):
+        node.right, top = split_rope(node.right, size - below - len(node.segment))
+        node.update()
+        return node, top
+    node.segment, segment = node.segment.split(size - below)
+    top = merge_ropes(RopeNode(segment), node.right)
+    node.right = None
+    node.update()
+    return node, top
+
+
+def rope_crates(node: RopeNode | None) -> Iterator[str]:
+    """
+    Crates of a rope from bottom to top
+    """
+    path: list[RopeNode] = []
+    while path or node is not None:
+        if node is not None:
+            node.push_flip()
+            path.append(node)
+            node = node.left
+        else:
+            node = path.pop()
+            yield from node.segment
+            node = node.right
+
+
+class SegmentStack:
+    """
+    Stack of crates as a rope of segments with a buffer of loose crates on top.
+    Moving a run splits and merges ropes in logarithmic time instead of copying
+    crates, and reversing it only flips a flag on the root of its rope.
+    Small moves go through the buffers: a stack pulls up to buffer_size crates
+    out of its rope when it runs out of loose ones and pushes them back as a
+    single segment when it has too many. A segment pushed back is merged with
+    the top segment of the rope if that one is small as well, so fragmentation
+    is bounded without ever copying large runs
+    """
+
+    buffer_size = 256
+
+    def __init__(self, crates: Iterable[str] = ()) -> None:
+        crates = tuple(crates)
+        self.root: RopeNode | None = RopeNode(Segment(crates, 0, len(crates))) if crates else None
+        self.top: list[str] = []
+        self.size = len(crates)
+
+    def _refill(self) -> None:
+        """
+        Move crates from the top of the rope to the bottom of the buffer until
+        it holds buffer_size crates or the rope is empty
+        """
+        rope_size = self.size - len(self.top)
+        pulled = min(rope_size, self.buffer_size - len(self.top))
+        self.root, top = split_rope(self.root, rope_size - pulled)
+        self.top[:0] = rope_crates(top)
+
+    def _flush(self) -> None:
+        """
+        Put loose crates into the rope as one segment, taking the rope's top
+        segment along if it's small
+        """
+        if not self.top:
+            return
+        crates = self.top
+        self.top = []
+        node = self.root
+        while node is not None:
+            node.push_flip()
+            if node.right is None:
+                if len(node.segment) < self.buffer_size:
+                    self.root, last = split_rope(self.root, self.root.size - len(node.segment))
+                    crates[:0] = rope_crates(last)
+                break
+            node = node.right
+        leaf = tuple(crates)
+        self.root = merge_ropes(self.root, RopeNode(Segment(leaf, 0, len(leaf))))
+
+    def pop_top(self, amount: int) -> "SegmentStack":
+        """
+        Remove top amount crates and return them as a stack
+        """
+        if amount > self.size:
+            raise IndexError("pop from empty stack")
+        run = SegmentStack()
+        run.size = amount
+        top = self.top
+        if len(top) < amount <= self.buffer_size:
+            self._refill()
+            top = self.top
+        self.size -= amount
+        if amount <= len(top):
+            cut = len(top) - amount
+            run.top = top[cut:]
+            del top[cut:]
+            return run
+        self.root, run.root = split_rope(self.root, self.size)
+        run.top, self.top = top, []
+        return run
+
+    def push(self, run: "SegmentStack") -> None:
+        """
+        Put a run from pop_top on top, the run is taken over
+        """
+        self.size += run.size
+        if run.size <= self.buffer_size:
+            if len(self.top) + run.size > self.buffer_size:
+                self._flush()
+            self.top.extend(run.top if run.root is None else run)
+            return
+        self._flush()
+        self.root = merge_ropes(self.root, run.root)
+        self.top = run.top
+
+    def push_reversed(self, run: "SegmentStack") -> None:
+        """
+        Put a run from pop_top upside down on top, the run is taken over
+        """
+        self.size += run.size
+        if run.size <= self.buffer_size:
+            if len(self.top) + run.size > self.buffer_size:
+                self._flush()
+            self.top.extend(reversed(run.top) if run.root is None else reversed(list(run)))
+            return
+        # Loose crates of the run end up at its bottom, below its flipped rope
+        self.top.extend(reversed(run.top))
+        self._flush()
+        if run.root is not None:
+            run.root.flip = not run.root.flip
+        self.root = merge_ropes(self.root, run.root)
+
+    def move_top(self, target: "SegmentStack", amount: int, reverse: bool = False) -> None:
+        """
+        Move top amount crates onto target, upside down if reverse. Small moves
+        between buffers skip making a run
+        """
+        top = self.top
+        if amount <= len(top) and len(target.top) + amount <= self.buffer_size:
+            cut = len(top) - amount
+            moved = top[cut:]
+            del top[cut:]
+            if reverse:
+                moved.reverse()
+            target.top.extend(moved)
+            self.size -= amount
+            target.size += amount
+        elif reverse:
+            target.push_reversed(self.pop_top(amount))
+        else:
+            target.push(self.pop_top(amount))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, idx: int) -> str:
+        """
+        Only negative indices, counted from the top through the buffer and the
+        rope
+        """
+        if not -self.size <= idx < 0:
+            raise IndexError("stack index out of range")
+        if idx >= -len(self.top):
+            return self.top[idx]
+        depth = -1 - idx - len(self.top)
+        node = self.root
+        while node is not None:
+            node.push_flip()
+            above = node.right.size if node.right is not None else 0
+            if depth < above:
+                node = node.right
+                continue
+            depth -= above
+            segment = node.segment
+            if depth < len(segment):
+                offset = segment.start + depth if segment.reversed else segment.stop - 1 - depth
+                return segment.crates[offset]
+            depth -= len(segment)
+            node = node.left
+        raise AssertionError("We shouldn't be here")
+
+    def __iter__(self) -> Iterator[str]:
+        yield from rope_crates(self.root)
+        yield from self.top
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class SegmentCratePlant(CratePlant):
+    """
+    CratePlant on segment stacks: job cost is logarithmic in the size of the
+    stacks, not linear in the number of crates moved
+    """
+
+    def create_stack(self, *crates: str, positon: int) -> None:
+        self.stacks[positon] = SegmentStack(crates)
+
+    def move(self, start: int, target: int, amount: int) -> None:
+        # One at a time back onto the same stack leaves it as it was
+        if start == target:
+            if amount > len(self.stacks[start]):
+                raise IndexError("pop from empty stack")
+            return
+        self.stacks[start].move_top(self.stacks[target], amount, reverse=True)
+
+
+class SegmentCratePlantv2(SegmentCratePlant):
+    reverses_order = False
+
+    def move(self, start: int, target: int, amount: int) -> None:
+        self.stacks[start].move_top(self.stacks[target], amount)
+
+
+# Job section is split this many bytes at a time, rounded up to a whole line
+JOBS_CHUNK_SIZE = 1 << 20
+
+
+def parse_jobs(data: bytes) -> tuple[array, array, array]:
+    """
+    Starts, targets and amounts of all jobs in one pass over the job section.
+    Well-formed jobs are just every sixth token: move N from S to T. Tokens
+    are made for one chunk of lines at a time, so they never take more memory
+    than the chunk
+    """
+    starts, targets, amounts = array("I"), array("I"), array("I")
+    position = 0
+    while position < len(data):
+        end = data.find(b"\n", position + JOBS_CHUNK_SIZE)
+        end = len(data) if end == -1 else end + 1
+        chunk = data[position:end]
+        position = end
+        tokens = chunk.split()
+        if len(tokens) % 6 == 0 and tokens[::6].count(b"move") == len(tokens) // 6:
+            starts.extend(map(int, tokens[3::6]))
+            targets.extend(map(int, tokens[5::6]))
+            amounts.extend(map(int, tokens[1::6]))
+            continue
+        # Anything else in there, fall back to picking out the jobs
+        for amount, start, target in re.findall(rb"move (\d+) from (\d+) to (\d+)", chunk):
+            starts.append(int(start))
+            targets.append(int(target))
+            amounts.append(int(amount))
+    return starts, targets, amounts
 
 
 def parse_input(filename: str, plant: CratePlant) -> None:
     try:
-        f = open(filename)
+        f = open(filename, "rb")
     except OSError as err:
         print(f"Couldn't open file {filename}. Error: {err}")
     else:
         with f:
-            regex = re.compile(r"( {3}|\[\S\]) ?")
+            regex = re.compile(rb"( {3}|\[\S\]) ?")
             stacks = defaultdict(list)
-            while (line := next(f)) != "\n":
+            while (line := next(f)).strip(b"\r\n"):
                 if m := regex.findall(line):
                     for idx, i in enumerate(m, start=1):
                         if i.strip():
-                            i = i.strip("[]")
+                            i = i.strip(b"[]").decode()
                             stacks[idx].append(i)
 
             for positon, crates in stacks.items():
                 plant.create_stack(*reversed(crates), positon=positon)
 
-            regex = re.compile(
-                r"move (?P<amount>\d+) from (?P<start>\d+) to (?P<target>\d+)"
-            )
-            for line in f:
-                if k := regex.match(line):
-                    plant.add_job(
-                        Job(
-                            int(k.group("start")),
-                            int(k.group("target")),
-                            int(k.group("amount")),
-                        )
-                    )
+            plant.add_jobs(*parse_jobs(f.read()))
 
 
 def main() -> None:
@@ -94,6 +500,20 @@ def main() -> None:
     crate_plant.perform_jobs()
     print(crate_plant.get_top_crates())
 
+    for plant_class in (CratePlant, CratePlantv2):
+        for filename in ("input_example", "input"):
+            crate_plant = plant_class()
+            parse_input(filename, crate_plant)
+            top_crates = crate_plant.resolve_top_crates()
+            crate_plant.perform_jobs()
+            assert top_crates == crate_plant.get_top_crates()
+
+    for plant_class, expected in ((SegmentCratePlant, "CMZ"), (SegmentCratePlantv2, "MCD")):
+        segment_plant = plant_class()
+        parse_input("input_example", segment_plant)
+        segment_plant.perform_jobs()
+        assert segment_plant.get_top_crates() == expected
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,5 @@
-from collections import deque
-from typing import Any, Deque, Iterable, Iterator
+from bisect import bisect_right
+from typing import Any, Iterable, Iterator
 
 
 def parse_input(filename: str) -> str:
@@ -13,18 +13,82 @@ def parse_input(filename: str) -> str:
             return f.read()
 
 
-def sliding_window(x: Iterable[Any], *, size: int) -> Iterator[tuple[list[Any], int]]:
-    window: Deque[Any] = deque(maxlen=size)
-    for idx, i in enumerate(x):
-        # Prefill the window until it contains amount of items equal to its size
-        window.append(i)
-        if len(window) == size:
-            yield list(window), idx
+def read_chunks(filename: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Read file in fixed-size binary chunks so the whole stream is never in memory
+    """
+    try:
+        f = open(filename, "rb")
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+    else:
+        with f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+
+def stream_markers(
+    chunks: Iterable[bytes], *window_sizes: int, first_only: bool = False
+) -> Iterator[tuple[int, int]]:
+    """
+    Yield (number of bytes consumed, window size) at every position where the
+    last window size bytes are all different, for each of window_sizes in one
+    pass. Same as first_nonrepeating_sequence with a flat table instead of a
+    dict, the state is carried across chunk boundaries.
+    With first_only every size is reported once and reading stops as soon as
+    all of them are
+    """
+    sizes = sorted(set(window_sizes))
+    if not sizes:
+        return
+    last_seen = [-1] * 256
+    run_start = 0
+    offset = 0
+    for chunk in chunks:
+        for idx, i in enumerate(chunk, start=offset):
+            if last_seen[i] >= run_start:
+                run_start = last_seen[i] + 1
+            last_seen[i] = idx
+            # Every window not longer than the distinct run ending here matches
+            if (run := idx - run_start + 1) >= sizes[0]:
+                matched = bisect_right(sizes, run)
+                for size in sizes[:matched]:
+                    yield idx + 1, size
+                if first_only:
+                    del sizes[:matched]
+                    if not sizes:
+                        return
+        offset += len(chunk)
+
+
+def first_markers(chunks: Iterable[bytes], *window_sizes: int) -> dict[int, int]:
+    """
+    Number of bytes consumed at the first marker of every window size, -1 if
+    there's none, from a single pass over the stream
+    """
+    firsts = dict.fromkeys(window_sizes, -1)
+    firsts.update((size, offset) for offset, size in stream_markers(chunks, *window_sizes, first_only=True))
+    return firsts
 
 
 def first_nonrepeating_sequence(x: Iterable[Any], window_size: int) -> int:
-    for window, idx in sliding_window(x, size=window_size):
-        if len(set(window)) == window_size:
+    """
+    Return number of items consumed when the last window_size items are all
+    different, -1 if there's no such window.
+    Single pass: remember where every item was last seen and move the start of
+    the current distinct run past the previous occurrence of a repeated item
+    """
+    if isinstance(x, str) and x.isascii():
+        x = x.encode("ascii")
+    if isinstance(x, (bytes, bytearray)):
+        return first_markers([x], window_size)[window_size]
+    last_seen: dict[Any, int] = {}
+    run_start = 0
+    for idx, i in enumerate(x):
+        if last_seen.get(i, -1) >= run_start:
+            run_start = last_seen[i] + 1
+        last_seen[i] = idx
+        if idx - run_start + 1 == window_size:
             return idx + 1
     return -1
 
@@ -41,6 +105,16 @@ def main() -> None:
     assert first_nonrepeating_sequence(input_example, 14) == 29
     print(first_nonrepeating_sequence(input_, 14))
 
+    # Huge signal files: read in chunks and never hold the whole stream
+    assert first_markers(read_chunks("input", chunk_size=7), 4, 14) == {
+        4: first_nonrepeating_sequence(input_, 4),
+        14: first_nonrepeating_sequence(input_, 14),
+    }
+    assert first_markers([input_example.encode()], 4, 14) == {4: 10, 14: 29}
+    # Every marker offset of both kinds in one pass
+    markers = stream_markers([input_example.encode()], 4, 14)
+    assert [offset for offset, size in markers if size == 14][:1] == [29]
+
     # Fun. Is the solution general enough to work with any iterable?
     # Well, works with list of ints
     input_example_1 = [ord(i) for i in input_example]
@@ -1,5 +1,17 @@
+from array import array
 from collections import defaultdict
+from typing import Iterable, Iterator
+import bisect
+import glob
+import hashlib
+import heapq
+import itertools
 import json
+import mmap
+import os
+import re
+import struct
+import sys
 
 
 def tree_factory():
@@ -11,12 +23,6 @@ def populate_dirs(d, *keys):
         d = d[i]
 
 
-def get_nested_value(d, *keys):
-    for i in keys:
-        d = d[i]
-    return d
-
-
 def insert_files(d, filename, size, *keys):
     for i in keys:
         d = d[i]
@@ -59,47 +65,414 @@ def parse_input(filename: str) -> defaultdict:
         return tree
 
 
-def find_dir_size(tree):
-    stack: list[list[str]] = []
-    dir_sizes = defaultdict(int)
-    for k in tree:
-        stack.append([k])
-    while stack:
-        abs_path = stack.pop()
-        val = get_nested_value(tree, *abs_path)
-        for k, v in val.items():
-            if isinstance(v, dict):
-                stack.append(abs_path + [k])
-            if isinstance(v, int):
-                s = "/"
-                dir_sizes[s] += v
-                for i in abs_path[1:]:
-                    s = f"{s}{i}/"
-                    dir_sizes[s] += v
-    return dir_sizes
+class SortedSizes:
+    """
+    Sorted multiset of sizes kept as buckets of at most 2 * bucket_size values,
+    with a Fenwick tree of bucket sums. Adding or removing a size, the smallest
+    size at least N and the sum of sizes at most N all take a bisect over bucket
+    maxima, O(log buckets) tree steps and C-level work within one bucket
+    """
+
+    bucket_size = 512
+
+    def __init__(self, sizes: Iterable[int] = ()) -> None:
+        sizes = sorted(sizes)
+        step = self.bucket_size
+        self.buckets: list[list[int]] = [sizes[i : i + step] for i in range(0, len(sizes), step)]
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        # Bucket maxima and the tree have to follow whenever buckets are split
+        # or dropped, which happens at most once per bucket_size changes
+        self.maxima = [bucket[-1] for bucket in self.buckets]
+        self.tree = [0] + [sum(bucket) for bucket in self.buckets]
+        for i in range(1, len(self.tree)):
+            if (parent := i + (i & -i)) < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def _add_to_sum(self, bucket_idx: int, delta: int) -> None:
+        i = bucket_idx + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _sum_of_buckets(self, num_of_buckets: int) -> int:
+        total = 0
+        i = num_of_buckets
+        while i:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, size: int) -> None:
+        if not self.buckets:
+            self.buckets.append([size])
+            self._rebuild()
+            return
+        idx = min(bisect.bisect_left(self.maxima, size), len(self.buckets) - 1)
+        bucket = self.buckets[idx]
+        bisect.insort(bucket, size)
+        self.maxima[idx] = bucket[-1]
+        if len(bucket) > 2 * self.bucket_size:
+            self.buckets[idx : idx + 1] = bucket[: self.bucket_size], bucket[self.bucket_size :]
+            self._rebuild()
+        elif size:
+            self._add_to_sum(idx, size)
+
+    def remove(self, size: int) -> None:
+        idx = bisect.bisect_left(self.maxima, size)
+        if idx == len(self.buckets):
+            raise ValueError(f"{size} not in sizes")
+        bucket = self.buckets[idx]
+        pos = bisect.bisect_left(bucket, size)
+        if bucket[pos] != size:
+            raise ValueError(f"{size} not in sizes")
+        del bucket[pos]
+        if not bucket:
+            del self.buckets[idx]
+            self._rebuild()
+        else:
+            self.maxima[idx] = bucket[-1]
+            self._add_to_sum(idx, -size)
+
+    def replace(self, old: int, new: int) -> None:
+        idx = bisect.bisect_left(self.maxima, old)
+        # Sizes usually change a little and stay in their bucket
+        if (
+            idx < len(self.buckets)
+            and (idx == 0 or self.maxima[idx - 1] <= new)
+            and (idx + 1 == len(self.buckets) or new <= self.buckets[idx + 1][0])
+        ):
+            bucket = self.buckets[idx]
+            pos = bisect.bisect_left(bucket, old)
+            if pos < len(bucket) and bucket[pos] == old:
+                del bucket[pos]
+                bisect.insort(bucket, new)
+                self.maxima[idx] = bucket[-1]
+                self._add_to_sum(idx, new - old)
+                return
+        self.remove(old)
+        self.add(new)
+
+    def smallest_at_least(self, size: int) -> int | None:
+        idx = bisect.bisect_left(self.maxima, size)
+        if idx == len(self.buckets):
+            return None
+        bucket = self.buckets[idx]
+        return bucket[bisect.bisect_left(bucket, size)]
+
+    def sum_at_most(self, size: int) -> int:
+        # Buckets before idx hold only sizes up to size, bucket idx some of them
+        idx = bisect.bisect_right(self.maxima, size)
+        total = self._sum_of_buckets(idx)
+        if idx < len(self.buckets):
+            bucket = self.buckets[idx]
+            total += sum(bucket[: bisect.bisect_right(bucket, size)])
+        return total
+
+    def __len__(self) -> int:
+        return sum(map(len, self.buckets))
+
+    def __iter__(self) -> Iterator[int]:
+        return itertools.chain.from_iterable(self.buckets)
+
+
+class DirIndex:
+    """
+    Flat directory index: directories are integer ids with parent pointers,
+    total size of files directly inside and total size of the whole subtree
+    are kept for each of them. Root is 0 and a child always gets a larger id
+    than its parent.
+    Terminal output can be fed in pieces, totals and a sorted index of them
+    are updated only along the ancestor chains of what has changed.
+    Names, children and the sorted index of an index loaded from a cache are
+    only built when something needs them
+    """
+
+    def __init__(self) -> None:
+        self.parents = array("q", [-1])
+        self.file_sizes = array("q", [0])
+        self.totals = array("q", [0])
+        # Flag per directory, set once it has been listed
+        self.listed = bytearray(1)
+        self.cwd = 0
+        self._names: list[str] | None = ["/"]
+        self._names_data = b""
+        self._children: list[dict[str, int]] | None = [{}]
+        self._sorted_totals: SortedSizes | None = SortedSizes([0])
+        self._sorted_column = array("q")
+        # Directories with a smaller id are in the sorted index, new ones join
+        # it with their totals at the end of a feed
+        self._num_sorted = 1
+        # Listing a directory again must not count its files twice, the listing
+        # may continue in the next feed
+        self.skip_files = False
+        self._pending: dict[int, int] = {}
+
+    @property
+    def names(self) -> list[str]:
+        if self._names is None:
+            self._names = self._names_data.decode().split("\n")
+            self._names_data = b""
+        return self._names
+
+    @property
+    def children(self) -> list[dict[str, int]]:
+        if self._children is None:
+            names, parents = self.names, self.parents
+            children: list[dict[str, int]] = [{} for _ in names]
+            for id_ in range(1, len(names)):
+                children[parents[id_]][names[id_]] = id_
+            self._children = children
+        return self._children
+
+    @property
+    def sorted_totals(self) -> SortedSizes:
+        if self._sorted_totals is None:
+            self._sorted_totals = SortedSizes(self._sorted_column)
+            self._sorted_column = array("q")
+        return self._sorted_totals
+
+    def add_dir(self, parent: int, name: str) -> int:
+        if (id_ := self.children[parent].get(name)) is None:
+            id_ = len(self.parents)
+            self.names.append(name)
+            self.parents.append(parent)
+            self.children.append({})
+            self.listed.append(0)
+            self.file_sizes.append(0)
+            self.totals.append(0)
+            self.children[parent][name] = id_
+        return id_
+
+    def add_file(self, dir_id: int, size: int) -> None:
+        self.file_sizes[dir_id] += size
+        self._pending[dir_id] = self._pending.get(dir_id, 0) + size
+
+    def feed(self, lines: Iterable[str]) -> None:
+        """
+        Apply terminal output, the session may continue in the next call
+        """
+        for line in lines:
+            args = line.split()
+            if not args:
+                continue
+            if args[0] == "$":
+                if args[1] == "cd":
+                    if args[2] == "/":
+                        self.cwd = 0
+                    elif args[2] == "..":
+                        self.cwd = max(self.parents[self.cwd], 0)
+                    else:
+                        self.cwd = self.add_dir(self.cwd, args[2])
+                elif args[1] == "ls":
+                    self.skip_files = bool(self.listed[self.cwd])
+                    self.listed[self.cwd] = 1
+            elif args[0] == "dir":
+                self.add_dir(self.cwd, args[1])
+            elif not self.skip_files:
+                try:
+                    size = int(args[0])
+                except ValueError:
+                    continue
+                self.add_file(self.cwd, size)
+        self._propagate()
+
+    def _propagate(self) -> None:
+        """
+        Push pending size changes up to the root. Directories are visited from
+        the largest id down, so every one of them is updated once with changes of
+        its whole subtree already merged in
+        """
+        pending = self._pending
+        if not pending and self._num_sorted == len(self.totals):
+            return
+        heap = [-id_ for id_ in pending]
+        heapq.heapify(heap)
+        changed: list[tuple[int, int]] = []
+        while heap:
+            id_ = -heapq.heappop(heap)
+            delta = pending.pop(id_)
+            if id_ < self._num_sorted:
+                changed.append((self.totals[id_], self.totals[id_] + delta))
+            self.totals[id_] += delta
+            if (parent := self.parents[id_]) >= 0:
+                if parent not in pending:
+                    pending[parent] = 0
+                    heapq.heappush(heap, -parent)
+                pending[parent] += delta
+
+        # Changes of most totals at once, like the first feed of a whole log, are
+        # cheaper to sort from scratch, which is still O(log n) per change
+        num_of_new = len(self.totals) - self._num_sorted
+        if (len(changed) + num_of_new) * 2 > len(self.totals):
+            self._sorted_totals = SortedSizes(self.totals)
+        else:
+            sorted_totals = self.sorted_totals
+            for old, new in changed:
+                sorted_totals.replace(old, new)
+            for id_ in range(self._num_sorted, len(self.totals)):
+                sorted_totals.add(self.totals[id_])
+        self._num_sorted = len(self.totals)
+
+    def path(self, id_: int) -> str:
+        parts: list[str] = []
+        while id_ > 0:
+            parts.append(self.names[id_])
+            id_ = self.parents[id_]
+        return "/" + "".join(f"{name}/" for name in reversed(parts))
+
+    def dir_sizes(self) -> list[int]:
+        return self.totals.tolist()
+
+    def smallest_at_least(self, size: int) -> int | None:
+        return self.sorted_totals.smallest_at_least(size)
+
+    def sum_at_most(self, size: int) -> int:
+        return self.sorted_totals.sum_at_most(size)
+
+
+def parse_index(filename: str, index: DirIndex | None = None) -> DirIndex:
+    """
+    Parse terminal output into a new index or continue an existing session
+    """
+    index = DirIndex() if index is None else index
+    try:
+        f = open(filename)
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+        return index
+    else:
+        with f:
+            index.feed(f)
+        return index
+
+
+CACHE_MAGIC = b"D7IX"
+CACHE_VERSION = 2
+# magic, version, number of directories, cwd, skip files, length of names
+CACHE_HEADER = struct.Struct("<4sIqq?q")
+
+
+def save_index(index: DirIndex, path: str) -> None:
+    """
+    Pack the index into a binary file: header, then parents, file sizes, totals
+    and sorted totals as int64 columns, listed flags and newline separated names
+    (names come from whitespace separated terminal output, can't have newlines)
+    """
+    names = "\n".join(index.names).encode()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        header = CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, len(index.parents), index.cwd, index.skip_files, len(names)
+        )
+        f.write(header)
+        for column in (index.parents, index.file_sizes, index.totals, index.sorted_totals):
+            array("q", column).tofile(f)
+        f.write(index.listed)
+        f.write(names)
+    os.replace(tmp_path, path)
+
+
+def load_index(path: str) -> DirIndex | None:
+    """
+    Load an index saved by save_index, None if there's no valid one
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < CACHE_HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, size, cwd, skip_files, names_length = CACHE_HEADER.unpack_from(data)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                return None
+            # A truncated or overwritten cache is rebuilt, not half read
+            if size < 1 or names_length < 0 or not 0 <= cwd < size:
+                return None
+            if file_size != CACHE_HEADER.size + (4 * 8 + 1) * size + names_length:
+                return None
+            # Columns are copied straight out of the map, names and children are
+            # left for when they're needed
+            index = DirIndex()
+            with memoryview(data) as view:
+                offset = CACHE_HEADER.size
+                columns: list[array] = []
+                for _ in range(4):
+                    column = array("q")
+                    column.frombytes(view[offset : offset + 8 * size])
+                    columns.append(column)
+                    offset += 8 * size
+                index.listed = bytearray(view[offset : offset + size])
+                offset += size
+                index._names_data = bytes(view[offset : offset + names_length])
+
+    index.parents, index.file_sizes, index.totals, index._sorted_column = columns
+    index._names = None
+    index._children = None
+    index._sorted_totals = None
+    index._num_sorted = size
+    index.cwd = cwd
+    index.skip_files = skip_files
+    return index
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_index(filename: str) -> DirIndex:
+    """
+    Parse terminal output once, later runs with the same input load the index
+    from a cache file next to it, keyed by a hash of the input
+    """
+    try:
+        cache_path = f"{filename}.{file_digest(filename)[:16]}.idx"
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+        return DirIndex()
+    if (index := load_index(cache_path)) is None:
+        index = parse_index(filename)
+        save_index(index, cache_path)
+        # Caches of earlier versions of the input are of no use any more
+        for stale_path in glob.glob(f"{glob.escape(filename)}.*.idx"):
+            if stale_path != cache_path and re.fullmatch(r"[0-9a-f]{16}", stale_path[len(filename) + 1 : -4]):
+                os.remove(stale_path)
+    return index
 
 
-def part_1(tree):
-    return sum(v for _, v in find_dir_size(tree).items() if v <= 100000)
+def part_1(index: DirIndex) -> int:
+    return index.sum_at_most(100000)
 
 
-def part_2(tree):
+def part_2(index: DirIndex) -> int | None:
     available_space = 70000000
     required_space = 30000000
-    dir_sizes = find_dir_size(tree)
-    used_space = dir_sizes["/"]
+    used_space = index.totals[0]
     unused_space = available_space - used_space
     need_to_free = required_space - unused_space
-    return sorted(space for _, space in dir_sizes.items() if space > need_to_free)[0]
+    return index.smallest_at_least(need_to_free + 1)
 
 
-def main() -> None:
-    # tree = parse_input("input_example")
-    tree = parse_input("input")
-    print(json.dumps(tree, indent=4))
-    print(part_1(tree))
-    print(part_2(tree))
+def main(show_tree: bool = False) -> None:
+    index_example = parse_index("input_example")
+    assert part_1(index_example) == 95437
+    assert part_2(index_example) == 24933642
+    if show_tree:
+        # Debug view of the whole tree, parses the raw log
+        tree = parse_input("input")
+        print(json.dumps(tree, indent=4))
+    index = cached_index("input")
+    print(part_1(index))
+    print(part_2(index))
 
 
 if __name__ == "__main__":
-    main()
+    main(show_tree="--json" in sys.argv[1:])
@@ -1,4 +1,10 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+import mmap
+import os
+from typing import Iterator
 import functools
 
 
@@ -58,6 +64,11 @@ class Grid(dict[Coords, Node]):
             scenic_score_per_direction.append(direction_score)
         return functools.reduce(lambda x, y: x * y, scenic_score_per_direction, 1)
 
+    def count_visible(self) -> int:
+        return sum(1 for coords in self if self.is_visible(coords))
+
+    def best_scenic_score(self) -> int:
+        return max(self.scenic_score(coords) for coords in self)
 
     def __str__(self) -> str:
         return "\n".join(
@@ -66,6 +77,235 @@ class Grid(dict[Coords, Node]):
         )
 
 
+def sweep_line(heights, line: range, visible, scenic_scores) -> None:
+    """
+    Trees taller than the running maximum are visible from the line's start.
+    Trees lower than the current one are popped from a monotonic stack, whatever
+    is left on top blocks the view
+    """
+    tallest = -1
+    blocking_heights: list[int] = []
+    blocking_positions: list[int] = []
+    for pos, idx in enumerate(line):
+        height = heights[idx]
+        if height > tallest:
+            visible[idx] = 1
+            tallest = height
+        while blocking_heights and blocking_heights[-1] < height:
+            blocking_heights.pop()
+            blocking_positions.pop()
+        scenic_scores[idx] *= pos - blocking_positions[-1] if blocking_positions else pos
+        blocking_heights.append(height)
+        blocking_positions.append(pos)
+
+
+class FlatGrid:
+    """
+    Compact grid: heights live row by row in a single uint8 buffer, rows start
+    every stride bytes and every byte is the height plus zero.
+    Only relative heights matter, so zero is subtracted just for printing and an
+    mmap of the input file can be used as is.
+    Visibility and viewing distances come from one sweep per row and column in
+    each direction, O(rows * columns) in total
+    """
+
+    def __init__(
+        self,
+        heights: array | mmap.mmap,
+        num_of_rows: int,
+        num_of_columns: int,
+        *,
+        stride: int | None = None,
+        zero: int = 0,
+    ):
+        self.heights = heights
+        self.num_of_rows = num_of_rows
+        self.num_of_columns = num_of_columns
+        self.stride = num_of_columns if stride is None else stride
+        self.zero = zero
+        self._visible: bytearray | None = None
+        self._scenic_scores: array | None = None
+
+    @classmethod
+    def from_rows(cls, data: list[list[int]]) -> "FlatGrid":
+        heights = array("B")
+        for row in data:
+            heights.extend(row)
+        return cls(heights, len(data), len(data[0]) if data else 0)
+
+    def row_lines(self, start: int, stop: int) -> Iterator[range]:
+        """
+        Flat indices of rows start..stop in both directions, in order of sight
+        """
+        for row_start in range(start * self.stride, stop * self.stride, self.stride):
+            line = range(row_start, row_start + self.num_of_columns)
+            yield line
+            yield line[::-1]
+
+    def column_lines(self, start: int, stop: int) -> Iterator[range]:
+        for column in range(start, stop):
+            line = range(column, self.num_of_rows * self.stride, self.stride)
+            yield line
+            yield line[::-1]
+
+    def lines(self) -> Iterator[range]:
+        yield from self.row_lines(0, self.num_of_rows)
+        yield from self.column_lines(0, self.num_of_columns)
+
+    def sweep(self) -> tuple[bytearray, array]:
+        if self._visible is not None and self._scenic_scores is not None:
+            return self._visible, self._scenic_scores
+        heights = self.heights
+        size = self.num_of_rows * self.stride
+        visible = bytearray(size)
+        scenic_scores = array("Q", [1]) * size
+        # Bytes between rows (newlines) aren't trees
+        if padding := array("Q", [0]) * (self.stride - self.num_of_columns):
+            for start in range(self.num_of_columns, size, self.stride):
+                scenic_scores[start : start + len(padding)] = padding
+        for line in self.lines():
+            sweep_line(heights, line, visible, scenic_scores)
+        self._visible, self._scenic_scores = visible, scenic_scores
+        return visible, scenic_scores
+
+    def count_visible(self) -> int:
+        return self.sweep()[0].count(1)
+
+    def best_scenic_score(self) -> int:
+        return max(self.sweep()[1], default=0)
+
+    def __str__(self) -> str:
+        return "\n".join(
+            "".join(str(height - self.zero) for height in self.heights[start : start + self.num_of_columns])
+            for start in range(0, self.num_of_rows * self.stride, self.stride)
+        )
+
+
+def _attach(names: dict[str, str]) -> tuple[dict[str, SharedMemory], dict[str, memoryview]]:
+    blocks = {key: SharedMemory(name=name) for key, name in names.items()}
+    # Scores are uint64, everything else is a byte per tree
+    views = {
+        key: block.buf.cast("Q") if key.endswith("scores") else block.buf
+        for key, block in blocks.items()
+    }
+    return blocks, views
+
+
+def _detach(blocks: dict[str, SharedMemory], views: dict[str, memoryview]) -> None:
+    for view in views.values():
+        view.release()
+    for block in blocks.values():
+        block.close()
+
+
+def _sweep_band(names: dict[str, str], shape: tuple[int, int, int], axis: str, start: int, stop: int) -> None:
+    num_of_rows, num_of_columns, stride = shape
+    grid = FlatGrid(array("B"), num_of_rows, num_of_columns, stride=stride)
+    blocks, views = _attach(names)
+    try:
+        lines = grid.row_lines(start, stop) if axis == "row" else grid.column_lines(start, stop)
+        for line in lines:
+            sweep_line(views["heights"], line, views[f"{axis}_visible"], views[f"{axis}_scores"])
+    finally:
+        _detach(blocks, views)
+
+
+def _reduce_band(names: dict[str, str], shape: tuple[int, int, int], start: int, stop: int) -> tuple[int, int]:
+    _, num_of_columns, stride = shape
+    blocks, views = _attach(names)
+    try:
+        visible_trees = 0
+        best_scenic_score = 0
+        for row_start in range(start * stride, stop * stride, stride):
+            row = slice(row_start, row_start + num_of_columns)
+            visible_trees += sum(
+                1 for a, b in zip(views["row_visible"][row], views["column_visible"][row]) if a or b
+            )
+            best_scenic_score = max(
+                best_scenic_score,
+                max((a * b for a, b in zip(views["row_scores"][row], views["column_scores"][row])), default=0),
+            )
+        return visible_trees, best_scenic_score
+    finally:
+        _detach(blocks, views)
+
+
+def _bands(size: int, num_of_bands: int) -> list[tuple[int, int]]:
+    step = -(-size // num_of_bands) if size else 1
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def parallel_sweep(grid: FlatGrid, workers: int | None = None) -> tuple[int, int]:
+    """
+    Number of visible trees and the best scenic score computed by a pool of
+    processes. Rows and columns are split into bands swept independently, the
+    grid and per-axis results live in shared memory instead of being pickled.
+    Each tree's score is the product of its row and column parts
+    """
+    workers = workers or os.cpu_count() or 1
+    size = grid.num_of_rows * grid.stride
+    if not size:
+        return 0, 0
+    shape = (grid.num_of_rows, grid.num_of_columns, grid.stride)
+    blocks = {
+        "heights": SharedMemory(create=True, size=size),
+        "row_visible": SharedMemory(create=True, size=size),
+        "column_visible": SharedMemory(create=True, size=size),
+        "row_scores": SharedMemory(create=True, size=8 * size),
+        "column_scores": SharedMemory(create=True, size=8 * size),
+    }
+    try:
+        # The last row may lack its newline
+        with memoryview(grid.heights) as heights:
+            copied = min(size, len(heights))
+            blocks["heights"].buf[:copied] = heights[:copied]
+        ones = array("Q", [1]) * size
+        for key in ("row_scores", "column_scores"):
+            blocks[key].buf[:] = memoryview(ones).cast("B")
+        del ones
+
+        names = {key: block.name for key, block in blocks.items()}
+        row_bands = _bands(grid.num_of_rows, 4 * workers)
+        column_bands = _bands(grid.num_of_columns, 4 * workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_sweep_band, names, shape, "row", *band) for band in row_bands]
+            futures += [executor.submit(_sweep_band, names, shape, "column", *band) for band in column_bands]
+            for future in futures:
+                future.result()
+            results = list(executor.map(_reduce_band, *zip(*((names, shape, *band) for band in row_bands))))
+        return sum(visible for visible, _ in results), max(score for _, score in results)
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+
+def load_grid(filename: str) -> FlatGrid:
+    """
+    Memory-map the input and use its digits in place, no Python object per tree
+    """
+    try:
+        f = open(filename, "rb")
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+        return FlatGrid(array("B"), 0, 0)
+    else:
+        with f:
+            if not f.seek(0, 2):
+                return FlatGrid(array("B"), 0, 0)
+            # The map stays valid after the file is closed
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(data)
+        while end and data[end - 1] in b"\r\n":
+            end -= 1
+        newline = data.find(b"\n", 0, end)
+        if newline == -1:
+            return FlatGrid(data, 1 if end else 0, end, zero=ord("0"))
+        stride = newline + 1
+        num_of_columns = newline - 1 if data[newline - 1] == ord("\r") else newline
+        return FlatGrid(data, -(-end // stride), num_of_columns, stride=stride, zero=ord("0"))
+
+
 def parse_input(filename: str) -> list[list[int]]:
     try:
         f = open(filename)
@@ -77,17 +317,22 @@ def parse_input(filename: str) -> list[list[int]]:
             return [[int(char) for char in line.strip()] for line in f if line.strip()]
 
 
-def part_1(grid: Grid) -> int:
-    return sum(1 for coords, _ in grid.items() if grid.is_visible(coords))
+def part_1(grid: Grid | FlatGrid) -> int:
+    return grid.count_visible()
 
 
-def part_2(grid: Grid) -> int:
-    return max(grid.scenic_score(coords) for coords, _ in grid.items())
+def part_2(grid: Grid | FlatGrid) -> int:
+    return grid.best_scenic_score()
 
 
 def main() -> None:
     grid_example = Grid(parse_input("input_example"))
-    grid = Grid(parse_input("input"))
+    flat_grid_example = FlatGrid.from_rows(parse_input("input_example"))
+    assert part_1(grid_example) == part_1(flat_grid_example) == 21
+    assert part_2(grid_example) == part_2(flat_grid_example) == 8
+    assert part_1(load_grid("input_example")) == 21
+    assert parallel_sweep(load_grid("input_example"), workers=2) == (21, 8)
+    grid = load_grid("input")
     print(part_1(grid_example))
     print(part_2(grid_example))
     print(part_1(grid))
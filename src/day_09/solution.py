@@ -1,4 +1,4 @@
-from typing import Callable, Iterator, Any
+from typing import Callable, Iterable, Iterator, Any
 from enum import Enum, auto
 from dataclasses import dataclass
 from operator import add, sub
@@ -139,6 +139,306 @@ class Rope:
             self._move(move)
 
 
+STEPS: dict[Direction, tuple[int, int]] = {
+    Direction.LEFT: (-1, 0),
+    Direction.RIGHT: (1, 0),
+    Direction.UP: (0, 1),
+    Direction.DOWN: (0, -1),
+}
+
+
+class CellSet:
+    """
+    Common part of visited-cell stores: a bounding box of the cells, kept up to
+    date as they're added
+    """
+
+    def __init__(self) -> None:
+        self.min_x = self.min_y = self.max_x = self.max_y = 0
+
+    def _extend_box(self, x: int, y: int) -> None:
+        self.min_x, self.max_x = min(self.min_x, x), max(self.max_x, x)
+        self.min_y, self.max_y = min(self.min_y, y), max(self.max_y, y)
+
+    def bounding_box(self) -> tuple[int, int, int, int]:
+        return self.min_x, self.min_y, self.max_x, self.max_y
+
+
+# Per bit position: byte with that bit set, 1 if the byte has it, 0 otherwise
+SET_BIT = [bytes(byte | 1 << bit for byte in range(256)) for bit in range(8)]
+HAS_BIT = [bytes(byte >> bit & 1 for byte in range(256)) for bit in range(8)]
+
+
+def set_row_bits(bits: bytearray, first: int, length: int) -> int:
+    """
+    Set length consecutive bits from bit first with a single mask, return how
+    many of them weren't set
+    """
+    lo, hi = first >> 3, ((first + length - 1) >> 3) + 1
+    chunk = int.from_bytes(bits[lo:hi], "little")
+    updated = chunk | ((1 << length) - 1) << (first - (lo << 3))
+    bits[lo:hi] = updated.to_bytes(hi - lo, "little")
+    return updated.bit_count() - chunk.bit_count()
+
+
+def set_column_bits(bits: bytearray, first: int, length: int, row_bytes: int) -> int:
+    """
+    Set length bits row_bytes bytes apart from bit first, they share a bit
+    position so a strided slice sets them all. Return how many weren't set
+    """
+    column = slice(first >> 3, (first >> 3) + row_bytes * (length - 1) + 1, row_bytes)
+    cells = bits[column]
+    bits[column] = cells.translate(SET_BIT[first & 7])
+    return length - cells.translate(HAS_BIT[first & 7]).count(1)
+
+
+class PackedCellSet(CellSet):
+    """
+    Visited cells as bits of sparse 64x64 tiles, a tile is created when the
+    first cell in it is visited and kept in a dict under its packed coordinates,
+    tile x * 2**32 + tile y. A tile takes 512 bytes and a dict entry, so a
+    path of cells takes about 10 bytes per cell and a filled area 1 bit.
+    Segments are set a tile at a time, a mask per row or a strided slice per
+    column
+    """
+
+    TILE_BITS = 6
+    TILE = 1 << TILE_BITS
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tiles: dict[int, bytearray] = {}
+        self.count = 0
+
+    def _tile(self, x: int, y: int) -> bytearray:
+        key = ((x >> self.TILE_BITS) << 32) + (y >> self.TILE_BITS)
+        if (tile := self.tiles.get(key)) is None:
+            tile = self.tiles[key] = bytearray(self.TILE * self.TILE // 8)
+        return tile
+
+    def add(self, x: int, y: int) -> None:
+        tile = self._tile(x, y)
+        idx = (y & (self.TILE - 1)) << self.TILE_BITS | x & (self.TILE - 1)
+        bit = 1 << (idx & 7)
+        if not tile[idx >> 3] & bit:
+            tile[idx >> 3] |= bit
+            self.count += 1
+            if x < self.min_x: self.min_x = x
+            elif x > self.max_x: self.max_x = x
+            if y < self.min_y: self.min_y = y
+            elif y > self.max_y: self.max_y = y
+
+    def add_segment(self, x: int, y: int, step_x: int, step_y: int, length: int) -> None:
+        """
+        Add length cells following (x, y) in a straight line
+        """
+        end_x, end_y = x + step_x * length, y + step_y * length
+        size, mask = self.TILE, self.TILE - 1
+        if step_y:
+            start, stop = min(y + step_y, end_y), max(y + step_y, end_y)
+            while start <= stop:
+                last = min(stop, start | mask)
+                first = (start & mask) << self.TILE_BITS | x & mask
+                self.count += set_column_bits(self._tile(x, start), first, last - start + 1, size // 8)
+                start = last + 1
+        else:
+            start, stop = min(x + step_x, end_x), max(x + step_x, end_x)
+            while start <= stop:
+                last = min(stop, start | mask)
+                first = (y & mask) << self.TILE_BITS | start & mask
+                self.count += set_row_bits(self._tile(start, y), first, last - start + 1)
+                start = last + 1
+        self._extend_box(end_x, end_y)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        for key, tile in self.tiles.items():
+            tile_x = (key + (1 << 31)) >> 32
+            origin_x, origin_y = tile_x << self.TILE_BITS, (key - (tile_x << 32)) << self.TILE_BITS
+            for byte_idx, byte in enumerate(tile):
+                if byte:
+                    for i in range(8):
+                        if byte >> i & 1:
+                            y, x = divmod(byte_idx * 8 + i, self.TILE)
+                            yield x + origin_x, y + origin_y
+
+
+class BitmapCellSet(CellSet):
+    """
+    Visited cells as one bit each over a bounding box known in advance. Rows
+    are padded to whole bytes, so the cells of a column share a bit position and
+    sit a fixed number of bytes apart
+    """
+
+    def __init__(self, min_x: int, min_y: int, max_x: int, max_y: int) -> None:
+        super().__init__()
+        self.origin_x, self.origin_y = min_x, min_y
+        self.width = (max_x - min_x + 8) & ~7
+        self.bits = bytearray((self.width * (max_y - min_y + 1) + 7) // 8)
+        self.count = 0
+
+    def add(self, x: int, y: int) -> None:
+        idx = (y - self.origin_y) * self.width + x - self.origin_x
+        bit = 1 << (idx & 7)
+        if not self.bits[idx >> 3] & bit:
+            self.bits[idx >> 3] |= bit
+            self.count += 1
+            if x < self.min_x: self.min_x = x
+            elif x > self.max_x: self.max_x = x
+            if y < self.min_y: self.min_y = y
+            elif y > self.max_y: self.max_y = y
+
+    def add_segment(self, x: int, y: int, step_x: int, step_y: int, length: int) -> None:
+        end_x, end_y = x + step_x * length, y + step_y * length
+        first = (min(y + step_y, end_y) - self.origin_y) * self.width + min(x + step_x, end_x) - self.origin_x
+        if step_y:
+            self.count += set_column_bits(self.bits, first, length, self.width >> 3)
+        else:
+            self.count += set_row_bits(self.bits, first, length)
+        self._extend_box(end_x, end_y)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        for byte_idx, byte in enumerate(self.bits):
+            if byte:
+                for i in range(8):
+                    if byte >> i & 1:
+                        y, x = divmod(byte_idx * 8 + i, self.width)
+                        yield x + self.origin_x, y + self.origin_y
+
+
+def head_bounding_box(input_: Iterable[Move]) -> tuple[tuple[int, int, int, int], int]:
+    """
+    Bounding box of the head's path and the number of steps. Every knot follows
+    its leader by moving towards it, so no knot ever leaves this box
+    """
+    x = y = min_x = min_y = max_x = max_y = steps = 0
+    for move in input_:
+        step_x, step_y = STEPS[move.direction]
+        x += step_x * move.amount
+        y += step_y * move.amount
+        min_x, max_x = min(min_x, x), max(max_x, x)
+        min_y, max_y = min(min_y, y), max(max_y, y)
+        steps += move.amount
+    return (min_x, min_y, max_x, max_y), steps
+
+
+def make_cell_store(input_: Iterable[Move]) -> CellSet:
+    return cell_store_for_box(*head_bounding_box(input_))
+
+
+def cell_store_for_box(box: tuple[int, int, int, int], steps: int) -> CellSet:
+    """
+    Bitmap when the head's bounding box is small compared to the number of steps,
+    packed keys otherwise
+    """
+    min_x, min_y, max_x, max_y = box
+    area = ((max_x - min_x + 8) & ~7) * (max_y - min_y + 1)
+    if area // 8 <= 16 * steps:
+        return BitmapCellSet(min_x, min_y, max_x, max_y)
+    return PackedCellSet()
+
+
+class FastRope:
+    """
+    Knot positions live in two flat lists of ints. A follower that isn't
+    touching its leader moves by the sign of the difference in each axis, once
+    a knot stays put none of the knots behind it can move either
+    """
+
+    def __init__(
+        self,
+        num_of_knots: int,
+        visited: CellSet | None = None,
+        *,
+        trails: list[CellSet] | None = None,
+    ) -> None:
+        """
+        trails: a store per knot to record cells visited by every one of them,
+        the tail's store becomes visited
+        """
+        self.xs = [0] * num_of_knots
+        self.ys = [0] * num_of_knots
+        self.trails = trails
+        if trails is not None:
+            assert len(trails) == num_of_knots
+            for trail in trails:
+                trail.add(0, 0)
+            visited = trails[-1]
+        self.visited = PackedCellSet() if visited is None else visited
+        self.visited.add(0, 0)
+        # Called with the new position of a knot that moved, None for knots
+        # nobody records
+        self.visits: list[Callable[[int, int], None] | None]
+        if trails is not None:
+            self.visits = [trail.add for trail in trails]
+        else:
+            self.visits = [None] * (num_of_knots - 1) + [self.visited.add]
+
+    def _slide(self, step_x: int, step_y: int, amount: int) -> None:
+        """
+        Move the whole rope amount cells at once, every knot draws a straight
+        segment
+        """
+        xs, ys = self.xs, self.ys
+        if self.trails is not None:
+            for i, trail in enumerate(self.trails):
+                trail.add_segment(xs[i], ys[i], step_x, step_y, amount)
+        else:
+            self.visited.add_segment(xs[-1], ys[-1], step_x, step_y, amount)
+        for i in range(len(xs)):
+            xs[i] += step_x * amount
+            ys[i] += step_y * amount
+
+    def move(self, move: Move) -> None:
+        """
+        Step until every knot moves exactly like the head: from then on the
+        rope's shape doesn't change and the rest of the move is one slide
+        """
+        remaining = self._move(move)
+        if remaining:
+            self._slide(*STEPS[move.direction], remaining)
+
+    def _move(self, move: Move) -> int:
+        """
+        Step the rope, calling the knot's hook from self.visits whenever a knot
+        moves. Returns how much of the move is left once the rope is in
+        lockstep
+        """
+        xs, ys = self.xs, self.ys
+        tail = len(xs) - 1
+        step_x, step_y = STEPS[move.direction]
+        visits = self.visits
+        remaining = move.amount
+        while remaining:
+            remaining -= 1
+            xs[0] += step_x
+            ys[0] += step_y
+            if visits[0] is not None:
+                visits[0](xs[0], ys[0])
+            in_lockstep = True
+            for i in range(1, tail + 1):
+                dx = xs[i - 1] - xs[i]
+                dy = ys[i - 1] - ys[i]
+                if -1 <= dx <= 1 and -1 <= dy <= 1:
+                    in_lockstep = False
+                    break
+                shift_x = (dx > 0) - (dx < 0)
+                shift_y = (dy > 0) - (dy < 0)
+                xs[i] += shift_x
+                ys[i] += shift_y
+                if visits[i] is not None:
+                    visits[i](xs[i], ys[i])
+                if shift_x != step_x or shift_y != step_y:
+                    in_lockstep = False
+            if in_lockstep:
+                break
+        return remaining
+
 def parse_input(filename: str) -> Iterator[Move]:
     try:
         f = open(filename)
@@ -157,24 +457,42 @@ def parse_input(filename: str) -> Iterator[Move]:
                 yield Move(direction=direction_map[direction], amount=int(number))
 
 
-def part_1(input_: list[Move]):
-    rope = Rope(2)
+def count_tail_cells(input_: list[Move], num_of_knots: int) -> int:
+    rope = FastRope(num_of_knots, make_cell_store(input_))
     for i in input_:
         rope.move(i)
-    print(len(rope.moves))
-
-
-def part_2(input_: list[Move]):
-    rope = Rope(10)
+    return len(rope.visited)
+
+
+def sweep_rope_lengths(input_: list[Move], max_num_of_knots: int) -> dict[int, int]:
+    """
+    Number of cells visited by the tail of every rope of 2..max_num_of_knots
+    knots in a single simulation: knot i of the longest rope moves exactly like
+    the tail of a rope of i + 1 knots
+    """
+    box, steps = head_bounding_box(input_)
+    trails = [cell_store_for_box(box, steps) for _ in range(max_num_of_knots)]
+    rope = FastRope(max_num_of_knots, trails=trails)
     for i in input_:
         rope.move(i)
-    print(len(rope.moves))
+    return {idx + 1: len(trail) for idx, trail in enumerate(trails) if idx}
+
+
+def part_1(input_: list[Move]) -> int:
+    return count_tail_cells(input_, 2)
+
+
+def part_2(input_: list[Move]) -> int:
+    return count_tail_cells(input_, 10)
 
 
 def main() -> None:
+    assert part_1(list(parse_input("input_example"))) == 13
+    assert part_2(list(parse_input("input_example_2"))) == 36
+    assert sweep_rope_lengths(list(parse_input("input_example_2")), 10)[10] == 36
     input_ = list(parse_input("input"))
-    part_1(input_)
-    part_2(input_)
+    print(part_1(input_))
+    print(part_2(input_))
 
 
 
@@ -0,0 +1,62 @@
+"""
+Cycles per second: stepping through Circuit's generator as it used to be
+versus running a pre-decoded Program.
+Run from the day directory: python benchmark.py [input_file] [repeat]
+"""
+import sys
+import time
+
+from solution import Instruction, Program, parse_input
+
+
+def legacy_circuit(entries):
+    # The generator before it got a timeline: the cost table is rebuilt per
+    # call and len(range(...)) is recomputed on every cycle
+    register = 1
+    cycle_number = 0
+    cycles_to_exec = {
+        Instruction.ADDX: 2,
+        Instruction.NOOP: 1,
+    }
+    for entry in entries:
+        for cycle in range(cycles_to_exec[entry.instruction]):
+            cycle_number += 1
+            yield cycle_number, register, entry
+            if cycle == len(range(cycles_to_exec[entry.instruction])) - 1:
+                register += entry.value
+
+
+def legacy_signal_strength(entries, interesting_cycles: range) -> int:
+    # Every cycle is tested for membership in the sample range
+    all_signal_strenghts = 0
+    for cycle, register, entry in legacy_circuit(entries):
+        if cycle in interesting_cycles:
+            all_signal_strenghts += cycle * register
+    return all_signal_strenghts
+
+
+def measure(run, num_of_cycles: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = run()
+    return num_of_cycles / (time.perf_counter() - start), result
+
+
+def main() -> None:
+    filename = sys.argv[1] if len(sys.argv) > 1 else "input"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    with open(filename) as f:
+        lines = f.read().splitlines() * repeat
+    entries = list(parse_input(filename)) * repeat
+    program = Program.decode(lines)
+    num_of_cycles = program.timeline().num_of_cycles
+    interesting_cycles = range(20, num_of_cycles + 1, 40)
+
+    before, expected = measure(lambda: legacy_signal_strength(entries, interesting_cycles), num_of_cycles)
+    after, result = measure(lambda: program.timeline().signal_strength(interesting_cycles), num_of_cycles)
+    assert result == expected
+    print(f"generator: {before:,.0f} cycles/s")
+    print(f"program:   {after:,.0f} cycles/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Iterator
+from operator import add
+from typing import Callable, Iterable, Iterator
 
 class Instruction(Enum):
     ADDX = auto()
@@ -16,31 +19,81 @@ class Circuit:
         self.entries = entries
         self.cycle = 0
         self.register = 1
+        # Cycle costs come from the instruction set
+        self.costs = {
+            instruction: ISA.specs[ISA.opcode(instruction.name.lower())].cycles
+            for instruction in Instruction
+        }
 
     def tick(self):
         self.cycle += 1
 
     def __iter__(self):
-        cycles_to_exec = {
-            Instruction.ADDX: 2,
-            Instruction.NOOP: 1,
-        }
         for entry in self.entries:
-            for cycle in range(cycles_to_exec[entry.instruction]):
+            cycles = self.costs[entry.instruction]
+            for cycle in range(cycles):
                 self.tick()
                 yield self.cycle, self.register, entry
-                if cycle == len(range(cycles_to_exec[entry.instruction])) - 1:
+                if cycle == cycles - 1:
                     self.register += entry.value
 
+    def timeline(self) -> "Timeline":
+        timeline = Timeline()
+        cycle = 0
+        register = 1
+        for entry in self.entries:
+            cycle += self.costs[entry.instruction]
+            if entry.value:
+                register += entry.value
+                timeline.change(cycle + 1, register)
+        timeline.num_of_cycles = cycle
+        return timeline
+
+
+class Timeline:
+    """
+    Register value only at cycles where it changes: value of change_values[i]
+    holds from cycle change_cycles[i] until the next change
+    """
+
+    def __init__(self) -> None:
+        self.change_cycles: list[int] = [1]
+        self.change_values: list[int] = [1]
+        self.num_of_cycles = 0
+
+    def change(self, cycle: int, register: int) -> None:
+        if self.change_cycles[-1] == cycle:
+            self.change_values[-1] = register
+        else:
+            self.change_cycles.append(cycle)
+            self.change_values.append(register)
+
+    def register_at(self, cycle: int) -> int:
+        """
+        Register value during the cycle, O(log changes). Cycles are counted from
+        1 to num_of_cycles
+        """
+        if not 1 <= cycle <= self.num_of_cycles:
+            raise IndexError(f"cycle {cycle} out of range 1..{self.num_of_cycles}")
+        return self.change_values[bisect_right(self.change_cycles, cycle) - 1]
+
+    def signal_strength(self, cycles: Iterable[int]) -> int:
+        """
+        Sum of signal strengths at the cycles the program runs for, others are
+        skipped as stepping through the program never reaches them
+        """
+        return sum(
+            cycle * self.register_at(cycle) for cycle in cycles if 1 <= cycle <= self.num_of_cycles
+        )
+
 
 def parse_instruction(line: str) -> Entry:
     args = line.strip().split()
-    if args[0] == "noop":
-        return Entry(Instruction.NOOP, 0)
-    elif args[0] == "addx":
-        return Entry(Instruction.ADDX, int(args[1]))
-    else:
+    opcode, operand = ISA.decode(args)
+    # Circuit only knows the instructions it has an Instruction for
+    if (name := ISA.specs[opcode].name.upper()) not in Instruction.__members__:
         raise AssertionError(f"Unknown instruction: {args}")
+    return Entry(Instruction[name], operand)
 
 def parse_input(filename: str) -> Iterator[Entry]:
     try:
@@ -52,35 +105,157 @@ def parse_input(filename: str) -> Iterator[Entry]:
             for line in f:
                 yield parse_instruction(line)
 
+@dataclass(frozen=True)
+class InstructionSpec:
+    name: str
+    cycles: int
+    # New register from the current one and the operand, None leaves it as is
+    effect: Callable[[int, int], int] | None
+
+
+class InstructionSet:
+    """
+    Instructions register their cycle cost and effect and get an opcode,
+    a program is decoded against the table once and run by opcode
+    """
+
+    def __init__(self) -> None:
+        self.specs: list[InstructionSpec] = []
+        self.opcodes: dict[str, int] = {}
+
+    def register(self, name: str, cycles: int, effect: Callable[[int, int], int] | None = None) -> int:
+        if name in self.opcodes:
+            raise AssertionError(f"Instruction already registered: {name}")
+        self.opcodes[name] = len(self.specs)
+        self.specs.append(InstructionSpec(name, cycles, effect))
+        return self.opcodes[name]
+
+    def opcode(self, name: str) -> int:
+        if (opcode := self.opcodes.get(name)) is None:
+            raise AssertionError(f"Unknown instruction: {name}")
+        return opcode
+
+    def decode(self, args: list[str]) -> tuple[int, int]:
+        """
+        Opcode and operand of a split line. Instructions with an effect take
+        exactly one operand, the others none
+        """
+        opcode = self.opcode(args[0])
+        if len(args) != 1 + (self.specs[opcode].effect is not None):
+            raise AssertionError(f"Wrong number of operands: {args}")
+        return opcode, int(args[1]) if len(args) > 1 else 0
+
+
+ISA = InstructionSet()
+ISA.register("noop", 1)
+ISA.register("addx", 2, add)
+
+
+class Program:
+    """
+    Pre-decoded program: opcode, operand and cycle cost of every instruction
+    in parallel arrays
+    """
+
+    def __init__(self, isa: InstructionSet = ISA) -> None:
+        self.isa = isa
+        self.opcodes = array("H")
+        self.operands = array("q")
+        self.costs = array("H")
+
+    @classmethod
+    def decode(cls, lines: Iterable[str], isa: InstructionSet = ISA) -> "Program":
+        program = cls(isa)
+        for line in lines:
+            args = line.split()
+            if not args:
+                continue
+            opcode, operand = isa.decode(args)
+            program.opcodes.append(opcode)
+            program.operands.append(operand)
+            program.costs.append(isa.specs[opcode].cycles)
+        return program
+
+    def timeline(self) -> Timeline:
+        effects = [spec.effect for spec in self.isa.specs]
+        timeline = Timeline()
+        change = timeline.change
+        cycle = 0
+        register = 1
+        for opcode, operand, cost in zip(self.opcodes, self.operands, self.costs):
+            cycle += cost
+            if (effect := effects[opcode]) is not None:
+                if (new_register := effect(register, operand)) != register:
+                    register = new_register
+                    change(cycle + 1, register)
+        timeline.num_of_cycles = cycle
+        return timeline
+
+
+def load_program(filename: str, isa: InstructionSet = ISA) -> Program:
+    try:
+        f = open(filename)
+    except OSError as err:
+        print(f"Couldn't open file {filename}. Error: {err}")
+        return Program(isa)
+    else:
+        with f:
+            return Program.decode(f, isa)
+
 def part_1() -> int:
-    circuit = Circuit(list(parse_input("input")))
     interesting_cycles = range(20, 221, 40)
-    all_signal_strenghts = 0
-    for cycle, register, entry in circuit:
-        if cycle in interesting_cycles:
-            signal_strenght = cycle * register
-            all_signal_strenghts += signal_strenght
-    return all_signal_strenghts
+    return load_program("input").timeline().signal_strength(interesting_cycles)
+
+def render(timeline: Timeline, width: int = 40, height: int | None = None) -> bytes:
+    """
+    Draw the whole screen at once: register of every cycle is expanded into a
+    NumPy array and a pixel is lit where the sprite covers the beam.
+    Rows are separated by newlines, by default as many full rows as the
+    program lasts
+    """
+    import numpy as np
+
+    if height is None:
+        height = timeline.num_of_cycles // width
+    num_of_cycles = width * height
+    change_cycles = np.array(timeline.change_cycles, dtype=np.int64)
+    change_values = np.array(timeline.change_values, dtype=np.int64)
+    shown = change_cycles <= num_of_cycles
+    change_cycles, change_values = change_cycles[shown], change_values[shown]
+    registers = np.repeat(change_values, np.diff(change_cycles, append=num_of_cycles + 1))
+    beam = np.arange(num_of_cycles, dtype=np.int64) % width
+    pixels = np.where(np.abs(beam - registers) <= 1, ord("#"), ord(".")).astype(np.uint8)
+    screen = np.full((height, width + 1), ord("\n"), dtype=np.uint8)
+    screen[:, :width] = pixels.reshape(height, width)
+    return screen.tobytes()[:-1]
+
 
 def part_2() -> str:
-    circuit = Circuit(list(parse_input("input")))
-    all_lines = []
-    line = []
-    for cycle, register, entry in circuit:
-        sprite = range(register - 1, register + 2)
-        cycle = (cycle - 1) % 40
-        if cycle in sprite:
-            line.append("#")
-        else:
-            line.append(".")
-        if len(line) == 40:
-            all_lines.append("".join(line))
-            line.clear()
-    return "\n".join(all_lines)
+    return render(load_program("input").timeline()).decode()
 
 def main() -> None:
     print(part_1())
     print(part_2())
+    circuit = Circuit(list(parse_input("input")))
+    timeline = load_program("input").timeline()
+    assert vars(timeline) == vars(circuit.timeline())
+    assert all(register == timeline.register_at(cycle) for cycle, register, _ in circuit)
+    short = Program.decode(["addx 5", "addx 3"]).timeline()
+    assert short.signal_strength(range(0, 10)) == 1 * 1 + 2 * 1 + 3 * 6 + 4 * 6
+    for cycle in (0, 5):
+        try:
+            short.register_at(cycle)
+        except IndexError:
+            pass
+        else:
+            raise AssertionError(f"Register read outside the program: {cycle}")
+    for line in ("addx", "noop 1", "addx 1 2"):
+        try:
+            Program.decode([line])
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError(f"Decoded a malformed line: {line}")
 
 
 
@@ -0,0 +1,65 @@
+"""
+Items inspected per second: per-item operation dispatch as it used to be
+versus the pre-specialized operations of the current Monkey.
+Run from the day directory: python benchmark.py [input_file] [rounds]
+"""
+import sys
+import time
+from operator import add, mul, pow
+from functools import partial
+
+from solution import MonkeyParty, Operation, Relief, create_monkey, parse_input
+
+
+def legacy_operation(monkey):
+    if monkey.operation is Operation.SQUARE:
+        return partial(lambda x, y: pow(x, y), y=2)
+    if monkey.operation is Operation.ADD:
+        return add
+    return mul
+
+
+def legacy_play_round(party: MonkeyParty, operations: dict):
+    # The inspection loop before operations got specialized: a None check,
+    # an int() wrap and a couple of method calls for every item
+    for id_, monkey in party.items():
+        operation = operations[id_]
+        while monkey.items:
+            item = monkey.items.popleft()
+            monkey.inspections += 1
+            if monkey.operation_value is None:
+                item = int(operation(item))
+            else:
+                item = int(operation(item, monkey.operation_value))
+            item = party.relieve(monkey, item)
+            party[monkey.test_item(item)].items.append(item)
+
+
+def make_party(filename: str) -> MonkeyParty:
+    return MonkeyParty(*(create_monkey(block) for block in parse_input(filename)), relief=Relief.MODULAR)
+
+
+def measure(filename: str, rounds: int, legacy: bool) -> float:
+    party = make_party(filename)
+    operations = {id_: legacy_operation(monkey) for id_, monkey in party.items()}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if legacy:
+            legacy_play_round(party, operations)
+        else:
+            party.play_round()
+    elapsed = time.perf_counter() - start
+    return sum(monkey.inspections for monkey in party.values()) / elapsed
+
+
+def main() -> None:
+    filename = sys.argv[1] if len(sys.argv) > 1 else "input"
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    before = measure(filename, rounds, legacy=True)
+    after = measure(filename, rounds, legacy=False)
+    print(f"before: {before:,.0f} items/s")
+    print(f"after:  {after:,.0f} items/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,51 @@
-from collections import deque
-from operator import add, mul, pow
+from collections import Counter, deque
+from operator import add, mul
 from dataclasses import dataclass
 from enum import Enum, auto
 from typing import Callable, Iterable, Iterator
 from itertools import takewhile
 from functools import partial, reduce
+from math import lcm
+
+
+class Relief(Enum):
+    NONE = auto()
+    DIVIDE = auto()
+    MODULAR = auto()
+
+
+class Operation(Enum):
+    SQUARE = auto()
+    ADD = auto()
+    MUL = auto()
+
+
+def compile_operation(operation: Operation, operation_value: int | None) -> Callable[[int], int]:
+    """
+    Specialize an operation once so inspecting an item is a single call
+    """
+    if operation is Operation.SQUARE:
+        return lambda item: item * item
+    if operation is Operation.ADD:
+        return partial(add, operation_value)
+    if operation is Operation.MUL:
+        return partial(mul, operation_value)
+    raise AssertionError(f"Unknown operation: {operation}")
 
 
 class Monkey:
+    __slots__ = (
+        "id_",
+        "items",
+        "test_value",
+        "test_true",
+        "test_false",
+        "operation",
+        "operation_value",
+        "operate",
+        "inspections",
+    )
+
     def __init__(
         self,
         *items: int,
@@ -15,8 +53,8 @@ class Monkey:
         test_value: int,
         test_true: int,
         test_false: int,
-        operation,
-        operation_value: int,
+        operation: Operation,
+        operation_value: int | None,
     ):
         self.id_: int = id_
         self.items: deque[int] = deque(items)
@@ -25,21 +63,19 @@ class Monkey:
         self.test_false: int = test_false
         self.operation = operation
         self.operation_value = operation_value
+        self.operate = compile_operation(operation, operation_value)
         self.inspections = 0
 
     def make_operation(self, item) -> int:
-        if self.operation_value is None:
-            # print("!!! SQRT !!!")
-            return int(self.operation(item))
-        return int(self.operation(item, self.operation_value))
-
-    def inspect(self, item: int):
-        self.inspections += 1
-        return self.make_operation(item)
+        return self.operate(item)
 
     def decrease_worry_level(self, item: int):
         return int(item // 3)
 
+    def reduce_worry_level(self, item: int, modulus: int):
+        # Divisibility by every test value survives reduction modulo their LCM
+        return item % modulus
+
     def test_item(self, item: int):
         if item % self.test_value == 0:
             return self.test_true
@@ -60,31 +96,151 @@ class Monkey:
         return f"Monkey {self.id_}: {','.join(map(str, self.items))}"
 
 class MonkeyParty(dict[int, Monkey]):
-    def __init__(self, *monkeys: Monkey):
+    def __init__(self, *monkeys: Monkey, relief: Relief = Relief.NONE):
         for monkey in monkeys:
             self[monkey.id_] = monkey
+        self.relief = relief
+        self.modulus = lcm(*(monkey.test_value for monkey in monkeys))
+        self.turn_order = {monkey_id: idx for idx, monkey_id in enumerate(self)}
+
+    def relieve(self, monkey: Monkey, item: int) -> int:
+        if self.relief is Relief.DIVIDE:
+            return monkey.decrease_worry_level(item)
+        if self.relief is Relief.MODULAR:
+            return monkey.reduce_worry_level(item, self.modulus)
+        return item
 
     def play_turn(self, id_:int):
         monkey = self[id_]
-        # print(f"Turn for: {monkey}")
-        # print(f"{monkey.operation=}, {monkey.operation_value}")
-        while monkey.items:
-            # print(monkey)
-            item = monkey.items.popleft()
-            # print(f"Current item: {item}")
-            item = monkey.inspect(item)
-            # print(f"Item after inspection: {item}")
-            # item = monkey.decrease_worry_level(item)
-            # print(f"Item after decreasing worry level: {item}")
-            id_to_throw = monkey.test_item(item)
-            # print(f"Id to throw: {id_to_throw}")
-            self[id_to_throw].items.append(item)
-            # print(f"Monkey with the new item: {self[id_to_throw]}")
+        # Hoist everything out of the loop, relief policy is picked once per turn
+        items = monkey.items
+        pop = items.popleft
+        operate = monkey.operate
+        test_value = monkey.test_value
+        throw_true = self[monkey.test_true].items.append
+        throw_false = self[monkey.test_false].items.append
+        # Monkeys never throw to themselves, so a turn inspects exactly the items it starts with
+        monkey.inspections += len(items)
+        if self.relief is Relief.MODULAR:
+            modulus = self.modulus
+            while items:
+                item = operate(pop()) % modulus
+                (throw_false if item % test_value else throw_true)(item)
+        elif self.relief is Relief.DIVIDE:
+            while items:
+                item = operate(pop()) // 3
+                (throw_false if item % test_value else throw_true)(item)
+        else:
+            while items:
+                item = operate(pop())
+                (throw_false if item % test_value else throw_true)(item)
 
     def play_round(self):
         for monkey in self:
             self.play_turn(monkey)
 
+    def play_rounds_batched(self, rounds: int):
+        """
+        Play rounds keeping items of every monkey in a NumPy int64 array, so a
+        turn handles all items at once: operation, reduction and test are applied
+        to the whole array and it's split between two targets with a mask.
+        Pays off when monkeys hold thousands of items
+        """
+        import numpy as np
+
+        if self.relief is not Relief.MODULAR:
+            raise ValueError(f"Batched rounds require modular relief, got {self.relief}")
+        modulus = self.modulus
+        # Operations are applied to already reduced items and must not overflow int64
+        largest_factor = max(
+            modulus if monkey.operation is Operation.SQUARE else monkey.operation_value
+            for monkey in self.values()
+        )
+        if (modulus - 1) * max(modulus, largest_factor) >= 2**63:
+            raise ValueError(f"Modulus {modulus} is too large for int64 batches")
+
+        batches = {
+            id_: np.array([item % modulus for item in monkey.items], dtype=np.int64)
+            for id_, monkey in self.items()
+        }
+        empty = np.empty(0, dtype=np.int64)
+        for _ in range(rounds):
+            for id_, monkey in self.items():
+                batch = batches[id_]
+                if not batch.size:
+                    continue
+                batches[id_] = empty
+                monkey.inspections += batch.size
+                batch = monkey.operate(batch) % modulus
+                divisible = batch % monkey.test_value == 0
+                batches[monkey.test_true] = np.concatenate((batches[monkey.test_true], batch[divisible]))
+                batches[monkey.test_false] = np.concatenate((batches[monkey.test_false], batch[~divisible]))
+
+        for id_, monkey in self.items():
+            monkey.items = deque(batches[id_].tolist())
+
+    def follow_item(self, id_: int, item: int) -> tuple[int, int, list[int]]:
+        """
+        Follow a single item through one round starting at monkey id_.
+        Return the monkey holding it and its worry level at the start of the next
+        round along with ids of monkeys that inspected it during this round
+        """
+        inspected_by: list[int] = []
+        while True:
+            monkey = self[id_]
+            item = self.relieve(monkey, monkey.make_operation(item))
+            inspected_by.append(id_)
+            id_to_throw = monkey.test_item(item)
+            # A monkey earlier in the turn order gets the item only in the next round
+            if self.turn_order[id_to_throw] < self.turn_order[id_]:
+                return id_to_throw, item, inspected_by
+            id_ = id_to_throw
+
+    def fast_forward(self, rounds: int):
+        """
+        Play many rounds at once following every item on its own.
+        Under modular relief (holder, worry level) of an item takes finitely many
+        values, so its trajectory becomes periodic and inspections for the rest of
+        the rounds are computed from the cycle instead of simulating it.
+        Inspection counters match play_round, order of items within a monkey may not
+        """
+        if self.relief is not Relief.MODULAR:
+            raise ValueError(f"Fast forward requires modular relief, got {self.relief}")
+        inspections: Counter[int] = Counter()
+        final_states: list[tuple[int, int]] = []
+        for id_, monkey in self.items():
+            for item in monkey.items:
+                states: list[tuple[int, int]] = []
+                history: list[list[int]] = []
+                seen: dict[tuple[int, int], int] = {}
+                state = (id_, item)
+                while len(states) < rounds and state not in seen:
+                    seen[state] = len(states)
+                    states.append(state)
+                    holder, worry_level, inspected_by = self.follow_item(*state)
+                    state = (holder, worry_level)
+                    history.append(inspected_by)
+                for inspected_by in history:
+                    inspections.update(inspected_by)
+                if state in seen:
+                    cycle_start = seen[state]
+                    full_cycles, remainder = divmod(rounds - len(states), len(states) - cycle_start)
+                    cycle: Counter[int] = Counter()
+                    for inspected_by in history[cycle_start:]:
+                        cycle.update(inspected_by)
+                    for monkey_id, count in cycle.items():
+                        inspections[monkey_id] += count * full_cycles
+                    for inspected_by in history[cycle_start : cycle_start + remainder]:
+                        inspections.update(inspected_by)
+                    state = states[cycle_start + remainder]
+                final_states.append(state)
+
+        for id_, monkey in self.items():
+            monkey.items.clear()
+            monkey.inspections += inspections[id_]
+        for id_, item in final_states:
+            self[id_].items.append(item)
+
 
 def parse_input(filename: str) -> Iterator[list[str]]:
     try:
@@ -114,14 +270,14 @@ def create_monkey(description: Iterable[str]) -> Monkey:
         elif "Operation" in line:
             line = line.strip().lstrip("Operation: new = old ")
             if "* old" in line:
-                monkey["operation"] = partial(lambda x, y: pow(x, y), y=2)
+                monkey["operation"] = Operation.SQUARE
                 monkey["operation_value"] = None
             else:
                 op, val = line.split()
                 if op == "+":
-                    monkey["operation"] = add
+                    monkey["operation"] = Operation.ADD
                 if op == "*":
-                    monkey["operation"] = mul
+                    monkey["operation"] = Operation.MUL
                 monkey["operation_value"] = int(val)
         elif "Test:" in line:
             line = line.strip().lstrip("Test: divisible by ")
@@ -135,27 +291,37 @@ def create_monkey(description: Iterable[str]) -> Monkey:
     return Monkey(*items, **monkey)
 
 
-def part_1() -> int:
-    ...
+def monkey_business(party: MonkeyParty) -> int:
+    return reduce(mul, sorted((monkey.inspections for monkey in party.values()), reverse=True)[:2], 1)
 
 
-def part_2() -> str:
-    ...
+def play(filename: str, rounds: int, relief: Relief) -> MonkeyParty:
+    monkeys = [create_monkey(block) for block in parse_input(filename)]
+    party = MonkeyParty(*monkeys, relief=relief)
+    for _ in range(rounds):
+        party.play_round()
+    return party
+
+
+def part_1(filename: str) -> int:
+    return monkey_business(play(filename, 20, Relief.DIVIDE))
+
+
+def part_2(filename: str) -> int:
+    # Without relief items grow into huge ints (no need for sys.set_int_max_str_digits
+    # anymore), keeping them modulo the LCM of test values bounds them
+    return monkey_business(play(filename, 10000, Relief.MODULAR))
 
 
 def main() -> None:
-    # sys.set_int_max_str_digits(1000000)
-    monkeys = [create_monkey(block) for block in parse_input("input")]
-    party = MonkeyParty(*monkeys)
-    for i in range(10000):
-        print(f"Round: {i}")
-        party.play_round()
-    for id_, monkey in party.items():
-        print(monkey)
-    print(reduce(mul, sorted((monkey.inspections for id, monkey in party.items()), reverse=True)[:2], 1))
+    assert part_1("input_example") == 10605
+    print(part_1("input"))
+    assert part_2("input_example") == 2713310158
+    print(part_2("input"))
 
-    print(part_1())
-    print(part_2())
+    party = MonkeyParty(*(create_monkey(block) for block in parse_input("input_example")), relief=Relief.MODULAR)
+    party.fast_forward(10000)
+    assert monkey_business(party) == 2713310158
 
 
 if __name__ == "__main__":